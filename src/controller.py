@@ -1,13 +1,38 @@
 import numpy as np
 from metrics import Metrics
 from config import leds_indexes, NUMBER_OF_LEDS, leds_indexes_small, display_modes, display_modes_small
-from utils import interpolate_color, get_random_color
+from utils import interpolate_rgb, hex_to_rgb
 import hid
 import time
 import datetime 
 import json
 import os
 import sys
+import queue
+import threading
+
+try:
+    import numba
+except Exception as e:
+    print("numba cannot start, digit rendering will run in pure Python : ", str(e))
+    numba = None
+
+def njit(*args, **kwargs):
+    if numba is None:
+        return lambda function: function
+    if getattr(sys, "frozen", False):
+        # A frozen executable has no source file to locate the cache from
+        kwargs.pop("cache", None)
+    def decorator(function):
+        try:
+            return numba.njit(*args, **kwargs)(function)
+        except Exception as e:
+            # The cache needs the source file (e.g. only the .pyc is shipped)
+            print(f"numba cannot cache {function.__name__}, compiling it without cache : ", str(e))
+            kwargs.pop("cache", None)
+            return numba.njit(*args, **kwargs)(function)
+    return decorator
+
 
 
 # Digit mask for 7-segment displays
@@ -25,32 +50,84 @@ digit_mask = np.array(
         [1, 1, 1, 1, 1, 1, 1],  # 8
         [1, 1, 1, 1, 0, 1, 1],  # 9
         [0, 0, 0, 0, 0, 0, 0],  # nothing
-    ]
+    ],
+    dtype=np.uint8,
 )
 
+# One byte per digit, segment i of the mask is bit i
+DIGIT_BITS = np.packbits(digit_mask, axis=1, bitorder='little').squeeze(axis=1)
+
+# Flat segment patterns for every 2 and 3 digit combination, indexed by digits
+DIGIT2_LUT = np.concatenate(np.broadcast_arrays(
+    digit_mask[:, None], digit_mask[None, :]), axis=-1)
+DIGIT3_LUT = np.concatenate(np.broadcast_arrays(
+    digit_mask[:, None, None], digit_mask[None, :, None], digit_mask[None, None, :]), axis=-1)
+
 letter_mask = {
     'H': [1, 0, 1, 1, 1, 0, 1],
 }
 
-
-
-def _number_to_array(number):
-    if number>=10:
-        return _number_to_array(int(number/10))+[number%10]
-    else:
-        return [number]
-
-def get_number_array(temp, array_length=3, fill_value=-1):
-    if temp<0:
-        return [fill_value]*array_length
-    else:
-        narray = _number_to_array(temp)
-        if (len(narray)!=array_length):
-            if(len(narray)<array_length):
-                narray = np.concatenate([[fill_value]*(array_length-len(narray)),narray])
-            else:
-                narray = narray[1:]
-        return narray
+# Gradient color sources that do not depend on the metrics
+time_sources = ("seconds", "minutes", "hours", "cycle")
+
+
+
+@njit(cache=True)
+def digits3(n, fill, out):
+    """Writes the last 3 digits of n into out, leading zeros replaced by fill."""
+    if n < 0:
+        out[0] = fill
+        out[1] = fill
+        out[2] = fill
+        return
+    out[2] = n % 10
+    n //= 10
+    out[1] = fill if n == 0 else n % 10
+    n //= 10
+    out[0] = fill if n == 0 else n % 10
+
+@njit(cache=True)
+def digits2(n, fill, out):
+    """Writes the last 2 digits of n into out, leading zero replaced by fill."""
+    if n < 0:
+        out[0] = fill
+        out[1] = fill
+        return
+    out[1] = n % 10
+    n //= 10
+    out[0] = fill if n == 0 else n % 10
+
+@njit(cache=True)
+def render_device_metrics(leds, led_idx, temp_idx, unit_led, usage_idx, percent_led,
+                          temperature, usage, mask, digit3_buf, digit2_buf):
+    """Writes the big layout metrics of one device into leds.
+
+    temp_idx holds the 21 temperature LEDs and usage_idx the 16 usage LEDs (2 for the
+    "1" of 100-199, then 2 digits). unit_led is -1 when no unit LED is lit.
+    """
+    for i in range(led_idx.size):
+        leds[led_idx[i]] = 1
+    digits3(temperature, 10, digit3_buf)
+    for d in range(3):
+        for segment in range(7):
+            leds[temp_idx[d*7 + segment]] = mask[digit3_buf[d], segment]
+    if unit_led >= 0:
+        leds[unit_led] = 1
+    high = 1 if usage >= 100 else 0
+    leds[usage_idx[0]] = high
+    leds[usage_idx[1]] = high
+    digits2(usage, 10, digit2_buf)
+    for d in range(2):
+        for segment in range(7):
+            leds[usage_idx[2 + d*7 + segment]] = mask[digit2_buf[d], segment]
+    leds[percent_led] = 1
+
+def _use_pure_python():
+    """Replaces the jitted functions by their Python versions, all at once since they call each other."""
+    global digits3, digits2, render_device_metrics
+    digits3 = getattr(digits3, "py_func", digits3)
+    digits2 = getattr(digits2, "py_func", digits2)
+    render_device_metrics = getattr(render_device_metrics, "py_func", render_device_metrics)
 
 class Controller:
     def __init__(self, config_path=None):
@@ -60,8 +137,20 @@ class Controller:
         self.PRODUCT_ID = 0x8001 
         self.dev = self.get_device()
         self.HEADER = 'dadbdcdd000000000000000000000000fc0000ff'
-        self.leds = np.array([0] * NUMBER_OF_LEDS)
+        self._init_packet_buffer()
+        # HID writes happen on a writer thread, only the latest frame is kept pending
+        self._frame_q = queue.Queue(maxsize=1)
+        # Set by the writer thread when a write fails, re-raised by send_packets
+        self._writer_error = None
+        threading.Thread(target=self._writer_loop, daemon=True).start()
+        self.leds = np.zeros(NUMBER_OF_LEDS, dtype=np.int32)
         self.leds_indexes = leds_indexes
+        self._digit3_buf = np.empty(3, dtype=np.int64)
+        self._digit2_buf = np.empty(2, dtype=np.int64)
+        # Minutes/seconds on a usage display, bytes [:2] (the "1" LEDs) stay 0 on purpose
+        self._minute_buf = np.zeros(16, dtype=np.uint8)
+        self._hour_buf = np.zeros(21, dtype=np.uint8)
+        self._hour_buf[14:] = letter_mask["H"]
         # Configurable config path
         if config_path is None:
             self.config_path = os.environ.get('DIGITAL_LCD_CONFIG', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json'))
@@ -70,8 +159,40 @@ class Controller:
         self.cpt = 0  # For alternate_time cycling
         self.cycle_duration = 50
         self.display_mode = None
-        self.colors = np.array(["ffe000"] * NUMBER_OF_LEDS)  # Will be set in update()
+        self._config_mtime = 0
+        self.colors = np.full((NUMBER_OF_LEDS, 3), [0xff, 0xe0, 0x00], dtype=np.uint8)  # Will be set in update()
+        self._mode_dispatch = {
+            "alternate_time": self._do_alternate_time,
+            "metrics": self._do_metrics,
+            "time": self._do_time,
+            "time_cpu": self._do_time_cpu,
+            "time_gpu": self._do_time_gpu,
+            "alternate_time_with_seconds": self._do_alternate_time_with_seconds,
+            "alternate_metrics": self._do_alternate_metrics,
+            "cpu_temp": self._do_cpu_temp,
+            "gpu_temp": self._do_gpu_temp,
+            "cpu_usage": self._do_cpu_usage,
+            "gpu_usage": self._do_gpu_usage,
+            "debug_ui": self._do_debug_ui,
+        }
+        # Compile the render kernel now rather than on the first frame, numba compiles lazily
+        # so typing or compilation errors only show up here
+        warm_up_args = (np.zeros(NUMBER_OF_LEDS, dtype=np.int32), np.zeros(2, dtype=np.int32),
+                        np.zeros(21, dtype=np.int32), 0, np.zeros(16, dtype=np.int32), 0,
+                        0, 0, digit_mask, self._digit3_buf, self._digit2_buf)
+        try:
+            render_device_metrics(*warm_up_args)
+        except Exception as e:
+            print("numba cannot compile the render kernel, digit rendering will run in pure Python : ", str(e))
+            _use_pure_python()
+            render_device_metrics(*warm_up_args)
         self.update()
+        self._poll()
+
+    def _poll(self):
+        # Sample the metrics and the clock once per tick, the display paths reuse them
+        self._current_metrics = self.metrics.get_metrics(self.temp_unit)
+        self._now = datetime.datetime.now()
 
     def load_config(self):
         try:
@@ -88,57 +209,90 @@ class Controller:
             print(f"Error initializing HID device: {e}")
             return None
 
+    def _init_packet_buffer(self):
+        # Packet 0 is the header followed by the first LED bytes, the next ones are
+        # a 0x00 byte followed by up to 64 LED bytes. The header and 0x00 bytes are
+        # written once, send_packets only scatters the LED bytes into the buffer.
+        header = bytes.fromhex(self.HEADER)
+        frame_size = NUMBER_OF_LEDS * 3
+        self._packet_bounds = [(0, 64)]
+        positions = list(range(len(header), 64))
+        start = 64
+        while len(positions) < frame_size:
+            size = min(64, frame_size - len(positions))
+            self._packet_bounds.append((start, start + 1 + size))
+            positions.extend(range(start + 1, start + 1 + size))
+            start += 1 + size
+        self._packet_buf = bytearray(start)
+        self._packet_buf[:len(header)] = header
+        self._packet_view = memoryview(self._packet_buf)
+        self._packet_array = np.frombuffer(self._packet_buf, dtype=np.uint8)
+        self._frame_positions = np.array(positions, dtype=np.intp)
+
     def set_leds(self, key, value):
         try:
-            self.leds[self.leds_indexes[key]] = value
+            self._set_leds_by_idx(self._idx[key], value)
         except KeyError:
             print(f"Warning: Key {key} not found in leds_indexes.")
 
+    def _set_leds_by_idx(self, idx, value):
+        self.leds[idx] = value
+
+    def _build_frame(self):
+        # RGB bytes of every LED, black for the LEDs that are off
+        mask = (self.leds != 0)[:, None]
+        return np.where(mask, self.colors, 0).astype(np.uint8, copy=False)
+
     def send_packets(self):
-        message = "".join([self.colors[i] if self.leds[i] != 0 else "000000" for i in range(NUMBER_OF_LEDS)])
-        packet0 = bytes.fromhex(self.HEADER+message[:128-len(self.HEADER)])
-        self.dev.write(packet0)
-        packets = message[88:]
-        for i in range(0,4):
-            packet = bytes.fromhex('00'+packets[i*128:(i+1)*128])
-            self.dev.write(packet)
-
-    def set_temp(self, temperature: int, device='cpu', unit="celsius"):
-        if temperature < 1000:
-            # Always use 3 digits with padding (fill with blank/10)
-            digit_array = get_number_array(temperature, array_length=3, fill_value=10)
-            leds = digit_mask[digit_array].flatten()
-            # GPU: Try no transformation - LEDs already in reverse order should compensate
-            # (keeping for testing - no transformation applied)
-            self.set_leds(device + '_temp', leds)
-            if unit == "celsius":
-                self.set_leds(device + '_celsius', 1)
-            elif unit == "fahrenheit":
-                self.set_leds(device + '_fahrenheit', 1)
-        else:
+        if self._writer_error is not None:
+            # Let the process exit on a lost device, like a direct write would
+            raise self._writer_error
+        self._packet_array[self._frame_positions] = self._build_frame().ravel()
+        packets = [bytes(self._packet_view[start:stop]) for start, stop in self._packet_bounds]
+        try:
+            self._frame_q.put_nowait(packets)
+        except queue.Full:
+            # Drop the stale pending frame, the writer only needs the latest one
+            try:
+                self._frame_q.get_nowait()
+            except queue.Empty:
+                pass
+            self._frame_q.put_nowait(packets)
+
+    def _writer_loop(self):
+        last_dev, last_packets = None, None
+        while True:
+            packets = self._frame_q.get()
+            dev = self.dev
+            if dev is last_dev and packets == last_packets:
+                # Same frame as the one already on this device, skip the USB writes
+                continue
+            try:
+                for packet in packets:
+                    dev.write(packet)
+                last_dev, last_packets = dev, packets
+            except Exception as e:
+                print(f"Error writing to HID device: {e}")
+                # Stop writing, the main thread re-raises the error on its next frame
+                self._writer_error = e
+                return
+
+    def render_metrics(self, device, temperature, usage, unit_led):
+        if temperature >= 1000:
             raise Exception("The numbers displayed on the temperature LCD must be less than 1000")
-
-    def set_usage(self, usage : int, device='cpu'):
-        if usage<200:
-            # Use 2 digits for the main number
-            digit_array = get_number_array(usage, array_length=2, fill_value=10)
-            # Prepend 2 LEDs for the "1" digit when usage >= 100
-            leds = np.concatenate(([int(usage>=100)]*2, digit_mask[digit_array].flatten()))
-            # GPU: Try no transformation - LEDs already in reverse order should compensate
-            # (keeping for testing - no transformation applied)
-            self.set_leds(device+'_usage', leds)
-            self.set_leds(device+'_percent_led', 1)
-        else:
+        if usage >= 200:
             raise Exception("The numbers displayed on the usage LCD must be less than 200")
+        # GPU: no transformation, its LED indexes are already in reverse order
+        led_idx, temp_idx, usage_idx, percent_led = self._metrics_idx[device]
+        render_device_metrics(self.leds, led_idx, temp_idx, unit_led, usage_idx, percent_led,
+                              temperature, usage, digit_mask, self._digit3_buf, self._digit2_buf)
 
     def display_metrics(self, devices=["cpu","gpu"]):
-        self.temp_unit = {device: self.config.get(f"{device}_temperature_unit", "celsius")for device in ["cpu","gpu"]}
-        metrics = self.metrics.get_metrics(temp_unit=self.temp_unit)
+        metrics = self._current_metrics
         for device in devices:
-            self.set_leds(device+"_led", 1)
-            self.set_temp(metrics[device+"_temp"], device=device, unit=self.temp_unit[device])
-            self.set_usage(metrics[device+"_usage"], device=device)
-            self.colors[self.leds_indexes[device]] = self.metrics_colors[self.leds_indexes[device]]
+            self.render_metrics(device, metrics[device+"_temp"], metrics[device+"_usage"], self._unit_led[device])
+            idx = self._idx[device]
+            self.colors[idx] = self.metrics_colors[idx]
 
     def display_digit_test(self):
         """Test mode: cycle through sequences 111, 222, 333... 999 every 2 seconds"""
@@ -160,110 +314,158 @@ class Controller:
             self.set_leds(device+"_led", 1)
             if cycle < 2:  # Show temperature
                 self.set_leds('celsius', 1)
-                digit_array = get_number_array(test_number, array_length=3, fill_value=10)
-                self.set_leds('digit_frame', digit_mask[digit_array].flatten())
+                digits3(test_number, 10, self._digit3_buf)
+                self.set_leds('digit_frame', DIGIT3_LUT[tuple(self._digit3_buf)])
             else:  # Show usage
                 self.set_leds('percent_led', 1)
-                digit_array = get_number_array(test_number, array_length=3, fill_value=10)
-                self.set_leds('digit_frame', digit_mask[digit_array].flatten())
-            self.colors = self.metrics_colors
+                digits3(test_number, 10, self._digit3_buf)
+                self.set_leds('digit_frame', DIGIT3_LUT[tuple(self._digit3_buf)])
+            self.colors[:] = self.metrics_colors
         else:
             # Big layout: show on both CPU and GPU simultaneously
             for device in ["cpu", "gpu"]:
-                self.set_leds(device+"_led", 1)
                 # Show test sequence on temperature (e.g., 111, 222, 333)
-                self.set_temp(test_number, device=device, unit="celsius")
-                # Show test digit on usage (e.g., 11, 22, 33)
-                self.set_usage(test_digit * 11, device=device)
+                # and test digit on usage (e.g., 11, 22, 33)
+                self.render_metrics(device, test_number, test_digit * 11, int(self._idx[device+"_celsius"]))
                 self.colors[self.leds_indexes[device]] = self.metrics_colors[self.leds_indexes[device]]
 
+    def _minute_leds(self, value):
+        # 2 unlit "1" LEDs followed by 2 digits, written into a preallocated buffer
+        digits2(value, 0, self._digit2_buf)
+        self._minute_buf[2:] = DIGIT2_LUT[tuple(self._digit2_buf)]
+        return self._minute_buf
+
+    def _hour_leds(self, hour):
+        # 2 digits followed by an "H", written into a preallocated buffer
+        digits2(hour, 0, self._digit2_buf)
+        self._hour_buf[:14] = DIGIT2_LUT[tuple(self._digit2_buf)]
+        return self._hour_buf
+
     def display_time(self, device="cpu"):
-        current_time = datetime.datetime.now()
-        self.set_leds(device+'_temp', np.concatenate((digit_mask[get_number_array(current_time.hour, array_length=2, fill_value=0)].flatten(),letter_mask["H"])))
-        self.set_leds(device+'_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.minute, array_length=2, fill_value=0)].flatten())))
-        self.colors[self.leds_indexes[device]] = self.time_colors[self.leds_indexes[device]]
+        current_time = self._now
+        self._set_leds_by_idx(self._idx[device+'_temp'], self._hour_leds(current_time.hour))
+        self._set_leds_by_idx(self._idx[device+'_usage'], self._minute_leds(current_time.minute))
+        idx = self._idx[device]
+        self.colors[idx] = self.time_colors[idx]
     
     def display_time_with_seconds(self):
-        current_time = datetime.datetime.now()
-        self.set_leds('cpu_temp', np.concatenate((digit_mask[get_number_array(current_time.hour, array_length=2, fill_value=0)].flatten(),letter_mask["H"])))
-        self.set_leds('gpu_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.second, array_length=2, fill_value=0)].flatten())))
-        self.set_leds('cpu_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.minute, array_length=2, fill_value=0)].flatten())))
-        self.colors = self.time_colors
+        current_time = self._now
+        self._set_leds_by_idx(self._idx['cpu_temp'], self._hour_leds(current_time.hour))
+        self._set_leds_by_idx(self._idx['gpu_usage'], self._minute_leds(current_time.second))
+        self._set_leds_by_idx(self._idx['cpu_usage'], self._minute_leds(current_time.minute))
+        self.colors[:] = self.time_colors
 
     def display_temp_small(self, device='cpu'):
-        unit = {device: self.config.get(f"{device}_temperature_unit", "celsius")for device in ["cpu","gpu"]}
-        self.set_leds(unit[device], 1)
-        self.set_leds(device+'_led', 1)
-        current_temp = self.metrics.get_metrics(self.temp_unit)[f"{device}_temp"]
-        self.colors = self.metrics_colors
+        self.set_leds(self._unit_led_key[device], 1)
+        self._set_leds_by_idx(self._idx[device+'_led'], 1)
+        current_temp = self._current_metrics[f"{device}_temp"]
+        self.colors[:] = self.metrics_colors
         if current_temp is not None:
             # Use 3 digits with blank padding (10) for proper display (e.g., " 50" not "050")
-            digit_array = get_number_array(current_temp, array_length=3, fill_value=10)
-            self.set_leds('digit_frame', digit_mask[digit_array].flatten())
+            digits3(current_temp, 10, self._digit3_buf)
+            self._set_leds_by_idx(self._idx['digit_frame'], DIGIT3_LUT[tuple(self._digit3_buf)])
         else:
             print(f"Warning: {device} temperature not available.")
     
     def display_usage_small(self, device='cpu'):
-        current_usage = self.metrics.get_metrics(self.temp_unit)[f"{device}_usage"]
-        self.set_leds('percent_led', 1)
-        self.set_leds(device+'_led', 1)
-        self.colors = self.metrics_colors
+        current_usage = self._current_metrics[f"{device}_usage"]
+        self._set_leds_by_idx(self._idx['percent_led'], 1)
+        self._set_leds_by_idx(self._idx[device+'_led'], 1)
+        self.colors[:] = self.metrics_colors
         if current_usage is not None:
             # Use 3 digits with blank padding (10) for proper display (e.g., " 75" not "075", or "100")
-            digit_array = get_number_array(current_usage, array_length=3, fill_value=10)
-            self.set_leds('digit_frame', digit_mask[digit_array].flatten())
+            digits3(current_usage, 10, self._digit3_buf)
+            self._set_leds_by_idx(self._idx['digit_frame'], DIGIT3_LUT[tuple(self._digit3_buf)])
         else:
             print(f"Warning: {device} usage not available.")
 
-    def get_config_colors(self, config, key="metrics"):
-        conf_colors = config.get(key, {}).get('colors', ["ffe000"] * NUMBER_OF_LEDS)
+    def get_config_colors(self, config, key="metrics", default="ffe000"):
+        """Parses the colors of a config section once.
+
+        Returns a dict with the (N, 3) uint8 RGB "colors", the indexes of the "random"
+        LEDs and of the "gradient" LEDs, the gradient "start"/"end" RGB colors and, for
+        each gradient LED, the index in "sources" of the factor driving it ("seconds",
+        "minutes", "hours", "cycle" or a metric name).
+        Dynamic colors are filled by _refresh_dynamic_colors().
+        """
+        colors = np.zeros((NUMBER_OF_LEDS, 3), dtype=np.uint8)
+        static, static_colors = [], []
+        random, gradient, start, end, sources, source_ids = [], [], [], [], [], []
+        conf_colors = (config or {}).get(key, {}).get('colors', [default] * NUMBER_OF_LEDS)
         if len(conf_colors) != NUMBER_OF_LEDS:
             print(f"Warning: config {key} colors length mismatch, using default colors.")
-            colors = ["ff0000"] * NUMBER_OF_LEDS
+            colors[:] = hex_to_rgb(["ff0000"])
         else:
-            colors = []
-            for color in conf_colors:
+            for i, color in enumerate(conf_colors):
                 if color.lower()=="random":
-                    colors.append(get_random_color())
+                    random.append(i)
                 elif "-" in color:
                     split_color = color.split("-")
-                    if len(split_color) == 3:
-                        start_color, end_color, key = split_color
-                        current_time = datetime.datetime.now()
-                        if key == "seconds":
-                            factor = current_time.second / 59
-                        elif key == "minutes":
-                            factor = current_time.minute / 59
-                        elif key == "hours":
-                            factor = current_time.hour / 23
-                        else:
-                            metric = key
-                            if metric not in self.metrics.get_metrics(self.temp_unit):
-                                print(f"Warning: {metric} not found in metrics, using start color.")
-                                factor = 0
-                            if self.metrics_min_value[metric] == self.metrics_max_value[metric]:
-                                print(f"Warning: {metric} min and max values are the same, using start color.")
-                                factor = 0
-                            else:
-                                factor = (self.metrics.get_metrics(self.temp_unit)[metric]-self.metrics_min_value[metric]) / (self.metrics_max_value[metric]-self.metrics_min_value[metric])
-                                if factor > 1:
-                                    factor = 1
-                                    print(f"Warning: {metric} value exceeds max value, clamping to 1.")
-                                elif factor < 0:
-                                    factor = 0
-                                    print(f"Warning: {metric} value below min value, clamping to 0.")
-                    else:
-                        start_color, end_color = split_color
-
-                        factor = 1 - abs((self.cpt%self.cycle_duration) - (self.cycle_duration/2)) / (self.cycle_duration/2)
-                    
-                    colors.append(interpolate_color(start_color, end_color, factor))
+                    source = split_color[2] if len(split_color) == 3 else "cycle"
+                    if source not in sources:
+                        sources.append(source)
+                    gradient.append(i)
+                    start.append(split_color[0])
+                    end.append(split_color[1])
+                    source_ids.append(sources.index(source))
                 else:
-                    colors.append(color)
-        return np.array(colors)
-    
+                    static.append(i)
+                    static_colors.append(color)
+            # Every static color is parsed with a single bytes.fromhex call
+            colors[static] = hex_to_rgb(static_colors)
+            # Invalid metric sources are reported once here and keep the start color
+            sources = [source if source in time_sources or self._valid_metric_source(source) else None for source in sources]
+        return {
+            "colors": colors,
+            "random": np.array(random, dtype=np.intp),
+            "gradient": np.array(gradient, dtype=np.intp),
+            "start": hex_to_rgb(start),
+            "end": hex_to_rgb(end),
+            "sources": sources,
+            "source_ids": np.array(source_ids, dtype=np.intp),
+        }
+
+    def _valid_metric_source(self, metric):
+        if metric not in self.metrics_min_value:
+            print(f"Warning: {metric} not found in metrics, using start color.")
+            return False
+        if self.metrics_min_value[metric] == self.metrics_max_value[metric]:
+            print(f"Warning: {metric} min and max values are the same, using start color.")
+            return False
+        return True
+
+    def _metric_factor(self, metric):
+        # Unclamped, _refresh_dynamic_colors clips all the factors at once
+        return (self._current_metrics[metric]-self.metrics_min_value[metric]) / (self.metrics_max_value[metric]-self.metrics_min_value[metric])
+
+    def _gradient_factor(self, source):
+        current_time = self._now
+        if source is None:
+            return 0
+        if source == "seconds":
+            return current_time.second / 59
+        elif source == "minutes":
+            return current_time.minute / 59
+        elif source == "hours":
+            return current_time.hour / 23
+        elif source == "cycle":
+            return 1 - abs((self.cpt%self.cycle_duration) - (self.cycle_duration/2)) / (self.cycle_duration/2)
+        return self._metric_factor(source)
+
+    def _refresh_dynamic_colors(self):
+        """Recomputes the random and gradient colors, one vectorized interpolation per color set."""
+        for spec in (self._metrics_color_spec, self._time_color_spec):
+            colors = spec["colors"]
+            if len(spec["random"]):
+                colors[spec["random"]] = np.random.randint(0, 256, (len(spec["random"]), 3))
+            if len(spec["gradient"]):
+                # One factor per source, gathered for every gradient LED
+                factors = np.array([self._gradient_factor(source) for source in spec["sources"]], dtype=np.float64)
+                np.clip(factors, 0.0, 1.0, out=factors)
+                colors[spec["gradient"]] = interpolate_rgb(spec["start"], spec["end"], factors[spec["source_ids"], None])
+
     def update(self):
-        self.leds = np.array([0] * NUMBER_OF_LEDS)
+        self.leds.fill(0)
         self.config = self.load_config()
         if self.config:
             VENDOR_ID = int(self.config.get('vendor_id', "0x0416"),16)
@@ -281,11 +483,12 @@ class Controller:
                 "gpu_usage": self.config.get('gpu_min_usage', 0),
             }
             self.display_mode = self.config.get('display_mode', 'metrics')
-            self.metrics_colors = self.get_config_colors(self.config, key="metrics")
-            self.time_colors = self.get_config_colors(self.config, key="time")
+            self._metrics_color_spec = self.get_config_colors(self.config, key="metrics")
+            self._time_color_spec = self.get_config_colors(self.config, key="time")
             self.update_interval = self.config.get('update_interval', 0.1)
             self.cycle_duration = int(self.config.get('cycle_duration', 5)/self.update_interval)
             self.metrics.update_interval = self.config.get('metrics_update_interval', 0.5)
+            self.temp_unit = {device: self.config.get(f"{device}_temperature_unit", "celsius") for device in ["cpu","gpu"]}
             if self.config.get('layout_mode', 'big')== 'small':
                 self.leds_indexes = leds_indexes_small
                 if self.display_mode not in display_modes_small:
@@ -312,70 +515,121 @@ class Controller:
                 "gpu_usage": 0,
             }
             self.display_mode = 'metrics'
-            self.time_colors = np.array(["ffe000"] * NUMBER_OF_LEDS)
-            self.metrics_colors = np.array(["ff0000"] * NUMBER_OF_LEDS)
+            self._metrics_color_spec = self.get_config_colors(None, key="metrics", default="ff0000")
+            self._time_color_spec = self.get_config_colors(None, key="time")
             self.update_interval = 0.1
             self.cycle_duration = int(5/self.update_interval)
             self.metrics.update_interval = 0.5
+            self.temp_unit = {"cpu": "celsius", "gpu": "celsius"}
             self.leds_indexes = leds_indexes
-        
+        self.metrics_colors = self._metrics_color_spec["colors"]
+        self.time_colors = self._time_color_spec["colors"]
+        # Resolve the LED indexes once, the display paths index with these arrays
+        self._idx = {key: np.asarray(indexes, dtype=np.int32) for key, indexes in self.leds_indexes.items()}
+        # Key of the unit LED of each device, the small layout has a single unit LED per unit
+        small_layout = self.leds_indexes is leds_indexes_small
+        self._unit_led_key = {
+            device: unit if small_layout else f"{device}_{unit}"
+            for device, unit in self.temp_unit.items()
+        }
+        # Unit LED index of each device for render_device_metrics, -1 when there is none
+        self._unit_led = {
+            device: int(self._idx[key]) if key in self._idx else -1
+            for device, key in self._unit_led_key.items()
+        }
+        # Per device arguments of render_device_metrics, big layout only
+        self._metrics_idx = {
+            device: (
+                self._idx[device+"_led"],
+                self._idx[device+"_temp"],
+                self._idx[device+"_usage"],
+                int(self._idx[device+"_percent_led"]),
+            )
+            for device in ("cpu", "gpu") if device+"_temp" in self._idx
+        }
 
         if VENDOR_ID != self.VENDOR_ID or PRODUCT_ID != self.PRODUCT_ID:
             print(f"Warning: Config VENDOR_ID or PRODUCT_ID changed, reinitializing device.")
             self.VENDOR_ID = VENDOR_ID
             self.PRODUCT_ID = PRODUCT_ID
             self.dev = self.get_device()
+        return bool(self.config)
+
+    def _do_alternate_time(self):
+        if self.cpt < self.cycle_duration:
+            self.display_time()
+            self.display_metrics(devices=['gpu'])
+        else:
+            self.display_time(device="gpu")
+            self.display_metrics(devices=['cpu'])
+
+    def _do_metrics(self):
+        self.display_metrics(devices=["cpu", "gpu"])
+
+    def _do_time(self):
+        self.display_time_with_seconds()
+
+    def _do_time_cpu(self):
+        self.display_time(device="gpu")
+        self.display_metrics(devices=['cpu'])
+
+    def _do_time_gpu(self):
+        self.display_time()
+        self.display_metrics(devices=['gpu'])
+
+    def _do_alternate_time_with_seconds(self):
+        if self.cpt < self.cycle_duration:
+            self.display_time_with_seconds()
+        else:
+            self.display_metrics()
+
+    def _do_alternate_metrics(self):
+        if self.cpt < self.cycle_duration/2:
+            self.display_temp_small(device='cpu')
+        elif self.cpt < self.cycle_duration:
+            self.display_temp_small(device='gpu')
+        elif self.cpt < 3*self.cycle_duration/2:
+            self.display_usage_small(device='cpu')
+        else:
+            self.display_usage_small(device='gpu')
+
+    def _do_cpu_temp(self):
+        self.display_temp_small(device='cpu')
+
+    def _do_gpu_temp(self):
+        self.display_temp_small(device='gpu')
+
+    def _do_cpu_usage(self):
+        self.display_usage_small(device='cpu')
+
+    def _do_gpu_usage(self):
+        self.display_usage_small(device='gpu')
+
+    def _do_debug_ui(self):
+        self.colors[:] = self.metrics_colors
+        self.leds[:] = 1
 
     def display(self):
         while True:
-            self.config = self.load_config()
-            self.update()
+            try:
+                config_mtime = os.stat(self.config_path).st_mtime
+            except OSError:
+                config_mtime = 0
+            if config_mtime != self._config_mtime:
+                # Only reparse the config when the file changed, retry next tick
+                # if it could not be loaded (e.g. read while being written)
+                if self.update():
+                    self._config_mtime = config_mtime
+            self.leds.fill(0)
+            self._poll()
+            self._refresh_dynamic_colors()
             if self.dev is None:
                 print("No device found, with VENDOR_ID: {}, PRODUCT_ID: {}".format(self.VENDOR_ID, self.PRODUCT_ID))
                 time.sleep(5)
             else:
-                if self.display_mode == "alternate_time":
-                    if self.cpt < self.cycle_duration:
-                        self.display_time()
-                        self.display_metrics(devices=['gpu'])
-                    else:
-                        self.display_time(device="gpu")
-                        self.display_metrics(devices=['cpu'])
-                elif self.display_mode == "metrics":
-                    self.display_metrics(devices=["cpu", "gpu"])
-                elif self.display_mode == "time":
-                    self.display_time_with_seconds()
-                elif self.display_mode == "time_cpu":
-                    self.display_time(device="gpu")
-                    self.display_metrics(devices=['cpu'])
-                elif self.display_mode == "time_gpu":
-                    self.display_time()
-                    self.display_metrics(devices=['gpu'])
-                elif self.display_mode == "alternate_time_with_seconds":
-                    if self.cpt < self.cycle_duration:
-                        self.display_time_with_seconds()
-                    else:
-                        self.display_metrics()
-                elif self.display_mode == "alternate_metrics":
-                    if self.cpt < self.cycle_duration/2:
-                        self.display_temp_small(device='cpu')
-                    elif self.cpt < self.cycle_duration:
-                        self.display_temp_small(device='gpu')
-                    elif self.cpt < 3*self.cycle_duration/2:
-                        self.display_usage_small(device='cpu')
-                    else:
-                        self.display_usage_small(device='gpu')
-                elif self.display_mode == "cpu_temp":
-                    self.display_temp_small(device='cpu')
-                elif self.display_mode == "gpu_temp":
-                    self.display_temp_small(device='gpu')
-                elif self.display_mode == "cpu_usage":
-                    self.display_usage_small(device='cpu')
-                elif self.display_mode == "gpu_usage":
-                    self.display_usage_small(device='gpu')
-                elif self.display_mode == "debug_ui":
-                    self.colors = self.metrics_colors
-                    self.leds[:] = 1
+                handler = self._mode_dispatch.get(self.display_mode)
+                if handler:
+                    handler()
                 else:
                     print(f"Unknown display mode: {self.display_mode}")
                 
@@ -395,6 +649,8 @@ def main(config_path, test_mode=False):
         try:
             while True:
                 controller.update()
+                controller._poll()
+                controller._refresh_dynamic_colors()
                 controller.display_digit_test()
                 controller.send_packets()
                 time.sleep(0.1)  # Update display faster for smoother cycling
@@ -16,6 +16,27 @@ def interpolate_color(start_color: str, end_color: str, factor: float) -> str:
     interpolated_color = (start_color * (1 - factor) + end_color * factor).astype(int)
     return ''.join(f"{c:02x}" for c in interpolated_color)
 
+def interpolate_rgb(start_color: np.ndarray, end_color: np.ndarray, factor) -> np.ndarray:
+    """
+    Interpolates between RGB colors, vectorized counterpart of interpolate_color.
+    Args:
+        start_color (np.ndarray): The starting colors as uint8 RGB values, shape (..., 3).
+        end_color (np.ndarray): The ending colors, same shape as start_color.
+        factor (float | np.ndarray): Interpolation factor(s) between 0 and 1, broadcast against the colors.
+    Returns:
+        np.ndarray: The interpolated colors as uint8 RGB values.
+    """
+    return (start_color * (1 - factor) + end_color * factor).astype(np.uint8)
+
 def get_random_color():
     return (f"{np.random.randint(0, 256):02x}{np.random.randint(0, 256):02x}{np.random.randint(0, 256):02x}")
-                
\ No newline at end of file
+                
+def hex_to_rgb(colors) -> np.ndarray:
+    """
+    Converts a sequence of hex colors to RGB bytes.
+    Args:
+        colors (list[str]): Colors in hex format without '#' (e.g., 'ff0000').
+    Returns:
+        np.ndarray: A (len(colors), 3) uint8 array of RGB values.
+    """
+    return np.frombuffer(bytes.fromhex("".join(colors)), dtype=np.uint8).reshape(-1, 3).copy()